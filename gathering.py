@@ -1,137 +1,239 @@
-import aiohttp
 import argparse
 import asyncio
-import json
+import hashlib
 import os
-import requests
-from typing import List, Dict
-from urllib.parse import urlparse, parse_qs
+from concurrent.futures import Executor, ProcessPoolExecutor
+import httpx
+from typing import List, Dict, Tuple
 
-from bs4 import BeautifulSoup
+import orjson
+from aiolimiter import AsyncLimiter
+from selectolax.lexbor import LexborHTMLParser
 
-def get_trending_languages() -> List[str]:
-    """
-    GitHub Trendingページからプログラミング言語のリストを取得します。
-    URLで使用できる形式（例: 'python', 'rust'）で返されます。
+from utils import TRENDING_URL, fetch_trending_page, load_dict, parse_trending_languages, run_async, save_dict
 
-    Returns:
-        プログラミング言語の文字列リスト。
-        取得に失敗した場合は空のリストを返します。
-    """
-    url = "https://github.com/trending"
-    try:
-        headers = {
-            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
-        }
-        response = requests.get(url, headers=headers)
-        response.raise_for_status()
-    except requests.RequestException as e:
-        print(f"Error fetching URL {url}: {e}")
-        return []
+# 全リクエストで共通のヘッダー (AsyncClientに一度だけ渡す)
+HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36",
+    "Accept-Language": "en-US,en;q=0.9,ja;q=0.8",
+    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,image/apng,*/*;q=0.8",
+}
 
-    soup = BeautifulSoup(response.text, 'html.parser')
-    
-    languages = []
-    # Languageドロップダウンメニューのコンテナを探す
-    language_menu = soup.find('details', id='select-menu-language')
-    if not language_menu:
-        return []
-        
-    # 'data-filter-list' 属性を持つリスト本体を探す
-    language_list_container = language_menu.find('div', attrs={'data-filter-list': True})
-    if not language_list_container:
-        return []
+# URL毎のETagと、そのURLから解析したリポジトリ情報のキャッシュ置き場
+ETAG_PATH = './temp/.etag.json'
+CACHE_DIR = './temp/.cache'
 
-    # 各言語のリンクから言語名を抽出
-    for lang_link in language_list_container.find_all('a'):
-        href = lang_link['href']
-        # URLのパス部分から言語名を取得 (例: /trending/python?since=daily -> python)
-        path = urlparse(href).path
-        parts = path.split('/')
-        if len(parts) > 2:
-            language_slug = parts[2]
-            languages.append(language_slug)
-            
-    return languages
+# "1,234" のような数値文字列からカンマを取り除くための変換テーブル
+_COMMA_STRIP = str.maketrans('', '', ',')
 
-async def get_github_trending_repositories_async(
-    session: aiohttp.ClientSession, 
-    url: str,
-    semaphore: asyncio.Semaphore  # <- 追加
-) -> List[Dict]:
+def create_client() -> httpx.AsyncClient:
+    """
+    github.com への接続を使い回すためのAsyncClientを作成します。
+    HTTP/2で全URLのリクエストを少数のTLS接続上に多重化します。
+    httpxは既定ではリダイレクトを追わないので、以前のaiohttp/requestsと同様に追うよう指定します。
+    """
+    limits = httpx.Limits(max_connections=20, max_keepalive_connections=20)
+    return httpx.AsyncClient(http2=True, limits=limits, timeout=10.0, headers=HEADERS, follow_redirects=True)
+
+def parse_trending(html: bytes, url: str) -> List[Dict]:
     """
-    aiohttpを使って非同期でGitHub TrendingのURLからリポジトリ情報をスクレイピングし、
+    GitHub TrendingページのHTMLからリポジトリ情報を抽出し、
     辞書のリストとして返します。
+
+    Args:
+        html: GitHub TrendingページのHTML (UTF-8のbytes)。
+        url: 取得元のURL (エラー表示用)。
+
+    Returns:
+        各リポジトリの情報を格納した辞書のリスト。
     """
-    headers = {
-        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36",
-        "Accept-Language": "en-US,en;q=0.9,ja;q=0.8", # <- ヘッダーを少し追加
-        "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,image/apng,*/*;q=0.8",
-    }
-    
-    # セマフォを使って同時実行数を制御
-    async with semaphore:
-        print(f"Fetching {url}...")
-        try:
-            # async with で非同期にGETリクエストを送信
-            async with session.get(url, headers=headers, timeout=10) as response:
-                # ステータスコードが200番台でない場合は例外を発生させる
-                response.raise_for_status()
-                # await でレスポンスのHTMLを非同期に取得
-                html = await response.text()
-        except Exception as e:
-            print(f"Error fetching URL {url}: {e}")
-            return []
-        
-        # 1秒待機してサーバーへの負荷を軽減
-        await asyncio.sleep(1)
+    # selectolaxはC実装のパーサーなので、html.parserより大幅に高速
+    # bytesはUTF-8として解析される (GitHubはUTF-8で返すので文字コードの推定は不要)
+    return _extract_repos(LexborHTMLParser(html), url)
 
-    # BeautifulSoupでのHTML解析はCPUバウンドな同期処理なので、awaitは不要
-    soup = BeautifulSoup(html, 'html.parser')
-    
-    repo_articles = soup.find_all('article', class_='Box-row')
+def _extract_repos(tree: LexborHTMLParser, url: str) -> List[Dict]:
+    """
+    解析済みのTrendingページからリポジトリ情報を抽出します。
+    """
+    repo_articles = tree.css('article.Box-row')
     
     trending_repos = []
     
-    # (以降の解析ロジックは変更なし)
     for article in repo_articles:
+        # 例外を投げずに済むよう、欠けている要素は事前にチェックしてスキップする
+        repo_link_tag = article.css_first('h2.h3 a')
+        if repo_link_tag is None:
+            print(f"Could not parse a repository on {url}: repository link not found")
+            continue
+        # attributesはアクセスの度に辞書を作り直すので、hrefは一度だけ取り出す
+        base_repo_path = repo_link_tag.attributes.get('href')
+        if not base_repo_path:
+            print(f"Could not parse a repository on {url}: repository link has no href")
+            continue
+        repo_name = repo_link_tag.text().replace('\n', '').replace(' ', '')
+        repo_link = "https://github.com" + base_repo_path
+        description_tag = article.css_first('p.col-9')
+        description = description_tag.text().strip() if description_tag else "No description provided."
+        language_tag = article.css_first('span[itemprop="programmingLanguage"]')
+        language = language_tag.text().strip() if language_tag else "N/A"
+        # セレクタをリンク毎に組み立てて2回走査する代わりに、リンクを1回だけ走査する
+        star_href = base_repo_path + '/stargazers'
+        fork_href = base_repo_path + '/forks'
+        star_tag = fork_tag = None
+        for link in article.css('a[href]'):
+            href = link.attributes['href']
+            if href == star_href and star_tag is None:
+                star_tag = link
+            elif href == fork_href and fork_tag is None:
+                fork_tag = link
+        date_range_stars_tag = article.css_first('span.d-inline-block.float-sm-right')
         try:
-            repo_link_tag = article.find('h2', class_='h3').find('a')
-            repo_name = repo_link_tag.text.replace('\n', '').replace(' ', '')
-            repo_link = "https://github.com" + repo_link_tag['href']
-            description_tag = article.find('p', class_='col-9')
-            description = description_tag.text.strip() if description_tag else "No description provided."
-            language_tag = article.find('span', itemprop='programmingLanguage')
-            language = language_tag.text.strip() if language_tag else "N/A"
-            base_repo_path = repo_link_tag['href']
-            star_tag = article.select_one(f'a[href="{base_repo_path}/stargazers"]')
-            fork_tag = article.select_one(f'a[href="{base_repo_path}/forks"]')
-            stars = int(star_tag.text.strip().replace(',', '')) if star_tag else 0
-            forks = int(fork_tag.text.strip().replace(',', '')) if fork_tag else 0
-            date_range_stars_tag = article.find('span', class_='d-inline-block float-sm-right')
+            # text(strip=True)でテキストノード毎に空白を除き、カンマは変換テーブルで除去する
+            stars = int(star_tag.text(strip=True).translate(_COMMA_STRIP)) if star_tag else 0
+            forks = int(fork_tag.text(strip=True).translate(_COMMA_STRIP)) if fork_tag else 0
             if date_range_stars_tag:
-                stars_text = date_range_stars_tag.text.strip().split(' ')[0]
-                date_range_stars = int(stars_text.replace(',', ''))
+                stars_text = date_range_stars_tag.text(strip=True).split(' ')[0]
+                date_range_stars = int(stars_text.translate(_COMMA_STRIP))
             else:
                 date_range_stars = 0
-            trending_repos.append({
-                'repository_name': repo_name,
-                'repository_url': repo_link,
-                'description': description,
-                'language': language,
-                'star': stars,
-                'fork': forks,
-                'date_range_stars': date_range_stars,
-            })
-        except (AttributeError, ValueError) as e:
+        except ValueError as e:
             print(f"Could not parse a repository on {url}: {e}")
             continue
+        trending_repos.append({
+            'repository_name': repo_name,
+            'repository_url': repo_link,
+            'description': description,
+            'language': language,
+            'star': stars,
+            'fork': forks,
+            'date_range_stars': date_range_stars,
+        })
         
     return trending_repos
 
-def save_dict(path:str, data:dict):
-    with open(path, 'w', encoding='utf-8') as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
+async def get_trending_languages_async(client: httpx.AsyncClient) -> Tuple[List[str], List[Dict]]:
+    """
+    GitHub Trendingページを一度だけ取得し、プログラミング言語のリストと
+    そのページ自体のリポジトリ情報を同じHTMLから返します。
+
+    Returns:
+        (プログラミング言語の文字列リスト, リポジトリ情報の辞書のリスト)。
+        取得に失敗した場合はどちらも空のリストを返します。
+    """
+    html = await fetch_trending_page(client)
+    if html is None:
+        return [], []
+    # 言語リストとリポジトリ情報は同じツリーから取り出す
+    tree = LexborHTMLParser(html)
+    return parse_trending_languages(tree), _extract_repos(tree, TRENDING_URL)
+
+async def fetch_page(
+    client: httpx.AsyncClient,
+    url: str,
+    semaphore: asyncio.Semaphore,
+    limiter: AsyncLimiter,
+    etag: str | None = None,
+) -> httpx.Response | None:
+    """
+    URLを取得してレスポンスを返します。
+    etagを渡した場合はIf-None-Matchを送り、304のレスポンスもそのまま返します。
+
+    Returns:
+        レスポンス。取得に失敗した場合はNone。
+    """
+    headers = {'If-None-Match': etag} if etag else {}
+    # リミッターで秒間リクエスト数を、セマフォで同時接続数をそれぞれ制御
+    await limiter.acquire()
+    async with semaphore:
+        print(f"Fetching {url}...")
+        try:
+            # 非同期にGETリクエストを送信 (レスポンスは読み切られた状態で返る)
+            response = await client.get(url, headers=headers)
+            if response.status_code == 304 and etag:
+                return response
+            # ステータスコードが200番台でない場合は例外を発生させる
+            response.raise_for_status()
+        except Exception as e:
+            print(f"Error fetching URL {url}: {e}")
+            return None
+    return response
+
+async def get_github_trending_repositories_async(
+    client: httpx.AsyncClient,
+    url: str,
+    semaphore: asyncio.Semaphore,
+    limiter: AsyncLimiter,
+    executor: Executor,
+    etags: Dict[str, str] | None = None,
+) -> List[Dict]:
+    """
+    httpxを使って非同期でGitHub TrendingのURLからリポジトリ情報をスクレイピングし、
+    辞書のリストとして返します。
+    HTMLの解析はexecutor上で行うので、他のURLの取得と並行して進みます。
+    etagsを渡した場合は、前回取得時のETagがあればIf-None-Matchを送り、
+    304ならキャッシュ済みの結果を返します。etagsは取得したETagで更新されます。
+    """
+    cache_path = get_cache_path(url)
+    etag = etags.get(url) if etags is not None and os.path.exists(cache_path) else None
+
+    response = await fetch_page(client, url, semaphore, limiter, etag)
+    if response is not None and response.status_code == 304:
+        # 更新がなければ本文は空なので、前回の解析結果をそのまま使う
+        cached_repos = load_cached_repos(cache_path)
+        if cached_repos is not None:
+            return cached_repos
+        # キャッシュが読めなければETagを捨て、ヘッダーなしで取り直す
+        etags.pop(url, None)
+        response = await fetch_page(client, url, semaphore, limiter)
+    if response is None:
+        return []
+
+    # HTML解析はCPUバウンドなので、プロセスプールに渡してGILを回避する
+    # 文字列へのデコードはせず、bytesのままパーサーに渡す
+    loop = asyncio.get_running_loop()
+    trending_repos = await loop.run_in_executor(executor, parse_trending, response.content, url)
+
+    if etags is None:
+        return trending_repos
+    etag = response.headers.get('ETag')
+    etags.pop(url, None)
+    if etag:
+        try:
+            save_dict(cache_path, trending_repos)
+            etags[url] = etag
+        except OSError as e:
+            print(f"Could not save cache for {url}: {e}")
+    return trending_repos
+
+def load_cached_repos(path: str) -> List[Dict] | None:
+    """
+    キャッシュ済みのリポジトリ情報を読み込みます。
+
+    Returns:
+        リポジトリ情報の辞書のリスト。読み込めなかった場合はNone。
+    """
+    try:
+        cached_repos = load_dict(path)
+    except (OSError, orjson.JSONDecodeError) as e:
+        print(f"Could not load cache {path}: {e}")
+        return None
+    return cached_repos if isinstance(cached_repos, list) else None
+
+def get_cache_path(url: str) -> str:
+    """
+    URLに対応するリポジトリ情報のキャッシュファイルのパスを返します。
+    """
+    return os.path.join(CACHE_DIR, hashlib.sha1(url.encode('utf-8')).hexdigest() + '.json')
+
+def load_etags(path: str) -> Dict[str, str]:
+    """
+    URL毎のETagを読み込みます。ファイルが無いか壊れている場合は空の辞書を返します。
+    """
+    try:
+        etags = load_dict(path)
+    except (OSError, orjson.JSONDecodeError):
+        return {}
+    return etags if isinstance(etags, dict) else {}
 
 def save_list(filepath: str, data: list[str]) -> bool:
     """
@@ -147,9 +249,9 @@ def save_list(filepath: str, data: list[str]) -> bool:
     try:
         # 'w'モードでファイルを開き、エンコーディングを'utf-8'に指定
         with open(filepath, 'w', encoding='utf-8') as f:
-            # 各要素の末尾に改行を加えて書き込む
-            for item in data:
-                f.write(item + '\n')
+            # 改行で連結して一度に書き込む (空リストの場合は空ファイル)
+            if data:
+                f.write('\n'.join(data) + '\n')
         return True
     except IOError as e:
         print(f"ファイルの保存中にエラーが発生しました: {e}")
@@ -173,10 +275,8 @@ def load_list(filepath: str) -> list[str] | None:
     try:
         # 'r'モードでファイルを開き、エンコーディングを'utf-8'に指定
         with open(filepath, 'r', encoding='utf-8') as f:
-            # readlines()で全行をリストとして取得し、
-            # リスト内包表記で各行の末尾の改行文字を削除する
-            lines = [line.strip() for line in f.readlines()]
-        return lines
+            # 一度に読み込み、splitlines()で改行文字を除いた行のリストにする
+            return f.read().splitlines()
     except IOError as e:
         print(f"ファイルの読み込み中にエラーが発生しました: {e}")
         return None
@@ -186,48 +286,67 @@ async def main(since:str, spoken_language_code:str):
     output_file = f'./temp/{since}_{spoken_language_code}.json'
     output_lang_file = f'./temp/lang_list.txt'
 
-    if default:
-        languages = ['all'] + get_trending_languages()
-    else:
-        languages = load_list('./temp/lang_list.txt')
+    semaphore = asyncio.Semaphore(15)
+    limiter = AsyncLimiter(10, 1.0)
+
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    etags = load_etags(ETAG_PATH)
+
+    trending_repos = []
+    with ProcessPoolExecutor(max_workers=os.cpu_count()) as executor:
+        async with create_client() as client:
+            if default:
+                # 言語リストの取得に使ったページは https://github.com/trending?since=daily と同じ内容なので、
+                # そのリポジトリ情報を再取得せずに使い回す
+                trending_languages, trending_repos = await get_trending_languages_async(client)
+                languages = ['all'] + trending_languages
+            else:
+                # lang_list.txt には 'all' が含まれないので、結果と対応させるため先頭に加える
+                languages = ['all'] + load_list('./temp/lang_list.txt')
 
-    if spoken_language_code=='all':
-        urls = [f"https://github.com/trending?since={since}"] + [f"https://github.com/trending/{i}?since={since}" for i in languages if i != 'all']
-    else:
-        urls = [f"https://github.com/trending?since={since}"] + [f"https://github.com/trending/{i}?since={since}&spoken_language_code={spoken_language_code}" for i in languages if i != 'all']
+            # languages[0] は常に 'all' なので、個別言語のURLは languages[1:] から作る
+            suffix = "" if spoken_language_code == 'all' else f"&spoken_language_code={spoken_language_code}"
+            urls = [f"https://github.com/trending/{lang}?since={since}{suffix}" for lang in languages[1:]]
+            # 使い回せる結果がない場合 (取得失敗を含む) は全体のページも取得する
+            if not trending_repos:
+                urls = [f"https://github.com/trending?since={since}{suffix}"] + urls
 
-    semaphore = asyncio.Semaphore(5)
+            print("task start")
+            async with asyncio.TaskGroup() as tg:
+                tasks = [tg.create_task(get_github_trending_repositories_async(client, url, semaphore, limiter, executor, etags)) for url in urls]
+            results = [task.result() for task in tasks]
+            print("task end")
 
-    async with aiohttp.ClientSession() as session:
-        tasks = [get_github_trending_repositories_async(session, url, semaphore) for url in urls]
-        print("task start")
-        results = await asyncio.gather(*tasks)
-        print("task end")
+    if trending_repos:
+        results = [trending_repos] + results
 
     output = {}
     langs = []
     for result, language in zip(results, languages):
         if len(result) == 0:
             continue
+        # 同じ言語のリポジトリは言語毎に一度だけ作った辞書を共有する (読み取り専用)
+        published = {'language': language, 'spoken_language_code': spoken_language_code, 'since': since}
         for repo in result:
-            if repo['repository_name'] in output.keys():
-                output[repo['repository_name']]['published'].append({'language':language, 'spoken_language_code': spoken_language_code, 'since': since})
+            name = repo['repository_name']
+            if name in output:
+                output[name]['published'].append(published)
             else:
-                output[repo['repository_name']] = repo
-                output[repo['repository_name']]['published'] = [{'language':language, 'spoken_language_code': spoken_language_code, 'since': since}]
+                repo['published'] = [published]
+                output[name] = repo
         if language != "all":
             langs.append(language)
     
-    if not os.path.exists(os.path.dirname(output_file)):
-        os.mkdir(os.path.dirname(output_file))
+    os.makedirs(os.path.dirname(output_file) or '.', exist_ok=True)
 
     save_dict(output_file, list(output.values()))
     save_list(output_lang_file, langs)
+    save_dict(ETAG_PATH, etags)
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument('--since', default='daily')
     parser.add_argument('--spoken_language_code', default='all')
     args = parser.parse_args()
-    asyncio.run(main(args.since, args.spoken_language_code))
+    run_async(main(args.since, args.spoken_language_code))
 # uv run gathering.py --since daily --spoken_language_code en
\ No newline at end of file
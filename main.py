@@ -1,56 +1,14 @@
-import aiohttp
 import asyncio
-import json
 import os
 import requests
+from concurrent.futures import ProcessPoolExecutor
+from aiolimiter import AsyncLimiter
 from bs4 import BeautifulSoup
-from typing import List, Dict
+from typing import List
 from urllib.parse import urlparse, parse_qs
 
-def get_trending_languages() -> List[str]:
-    """
-    GitHub Trendingページからプログラミング言語のリストを取得します。
-    URLで使用できる形式（例: 'python', 'rust'）で返されます。
-
-    Returns:
-        プログラミング言語の文字列リスト。
-        取得に失敗した場合は空のリストを返します。
-    """
-    url = "https://github.com/trending"
-    try:
-        headers = {
-            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
-        }
-        response = requests.get(url, headers=headers)
-        response.raise_for_status()
-    except requests.RequestException as e:
-        print(f"Error fetching URL {url}: {e}")
-        return []
-
-    soup = BeautifulSoup(response.text, 'html.parser')
-    
-    languages = []
-    # Languageドロップダウンメニューのコンテナを探す
-    language_menu = soup.find('details', id='select-menu-language')
-    if not language_menu:
-        return []
-        
-    # 'data-filter-list' 属性を持つリスト本体を探す
-    language_list_container = language_menu.find('div', attrs={'data-filter-list': True})
-    if not language_list_container:
-        return []
-
-    # 各言語のリンクから言語名を抽出
-    for lang_link in language_list_container.find_all('a'):
-        href = lang_link['href']
-        # URLのパス部分から言語名を取得 (例: /trending/python?since=daily -> python)
-        path = urlparse(href).path
-        parts = path.split('/')
-        if len(parts) > 2:
-            language_slug = parts[2]
-            languages.append(language_slug)
-            
-    return languages
+from gathering import create_client, get_github_trending_repositories_async
+from utils import SESSION, get_trending_languages, run_async, save_dict
 
 def get_trending_spoken_languages() -> List[str]:
     """
@@ -63,10 +21,7 @@ def get_trending_spoken_languages() -> List[str]:
     """
     url = "https://github.com/trending"
     try:
-        headers = {
-            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
-        }
-        response = requests.get(url, headers=headers)
+        response = SESSION.get(url, timeout=10)
         response.raise_for_status()
     except requests.RequestException as e:
         print(f"Error fetching URL {url}: {e}")
@@ -92,136 +47,59 @@ def get_trending_spoken_languages() -> List[str]:
 
     return spoken_languages
 
-async def get_github_trending_repositories_async(
-    session: aiohttp.ClientSession, 
-    url: str,
-    semaphore: asyncio.Semaphore  # <- 追加
-) -> List[Dict]:
-    """
-    aiohttpを使って非同期でGitHub TrendingのURLからリポジトリ情報をスクレイピングし、
-    辞書のリストとして返します。
-    """
-    headers = {
-        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36",
-        "Accept-Language": "en-US,en;q=0.9,ja;q=0.8", # <- ヘッダーを少し追加
-        "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,image/apng,*/*;q=0.8",
-    }
-    
-    # セマフォを使って同時実行数を制御
-    async with semaphore:
-        print(f"Fetching {url}...")
-        try:
-            # async with で非同期にGETリクエストを送信
-            async with session.get(url, headers=headers, timeout=10) as response:
-                # ステータスコードが200番台でない場合は例外を発生させる
-                response.raise_for_status()
-                # await でレスポンスのHTMLを非同期に取得
-                html = await response.text()
-        except Exception as e:
-            print(f"Error fetching URL {url}: {e}")
-            return []
-        
-        # 1秒待機してサーバーへの負荷を軽減
-        await asyncio.sleep(1)
-
-    # BeautifulSoupでのHTML解析はCPUバウンドな同期処理なので、awaitは不要
-    soup = BeautifulSoup(html, 'html.parser')
-    
-    repo_articles = soup.find_all('article', class_='Box-row')
-    
-    trending_repos = []
-    
-    # (以降の解析ロジックは変更なし)
-    for article in repo_articles:
-        try:
-            repo_link_tag = article.find('h2', class_='h3').find('a')
-            repo_name = repo_link_tag.text.replace('\n', '').replace(' ', '')
-            repo_link = "https://github.com" + repo_link_tag['href']
-            description_tag = article.find('p', class_='col-9')
-            description = description_tag.text.strip() if description_tag else "No description provided."
-            language_tag = article.find('span', itemprop='programmingLanguage')
-            language = language_tag.text.strip() if language_tag else "N/A"
-            base_repo_path = repo_link_tag['href']
-            star_tag = article.select_one(f'a[href="{base_repo_path}/stargazers"]')
-            fork_tag = article.select_one(f'a[href="{base_repo_path}/forks"]')
-            stars = int(star_tag.text.strip().replace(',', '')) if star_tag else 0
-            forks = int(fork_tag.text.strip().replace(',', '')) if fork_tag else 0
-            date_range_stars_tag = article.find('span', class_='d-inline-block float-sm-right')
-            if date_range_stars_tag:
-                stars_text = date_range_stars_tag.text.strip().split(' ')[0]
-                date_range_stars = int(stars_text.replace(',', ''))
-            else:
-                date_range_stars = 0
-            trending_repos.append({
-                'repository_name': repo_name,
-                'repository_url': repo_link,
-                'description': description,
-                'language': language,
-                'star': stars,
-                'fork': forks,
-                'date_range_stars': date_range_stars,
-            })
-        except (AttributeError, ValueError) as e:
-            print(f"Could not parse a repository on {url}: {e}")
-            continue
-        
-    return trending_repos
-
-def save_dict(path:str, data:dict):
-    with open(path, 'w', encoding='utf-8') as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
-
 async def main():
     output_dir = './data'
     countries = ['en', 'zh', 'ru', 'ja', 'pt', 'es']
     date_ranges = ['dayly', 'weekly', 'monthly']
-    all_langs = ['all'] + get_trending_languages()
 
-    semaphore = asyncio.Semaphore(5)
+    semaphore = asyncio.Semaphore(15)
+    limiter = AsyncLimiter(10, 1.0)
     
     output = {}
     langs = []
-    async with aiohttp.ClientSession() as session:
-        for date_range in date_ranges:
-            urls = [f"https://github.com/trending?since={date_range}"] + [f"https://github.com/trending/{i}?since={date_range}" for i in all_langs]
-            # 各URLに対する非同期タスク(コルーチン)のリストを作成
-            tasks = [get_github_trending_repositories_async(session, url, semaphore) for url in urls]
-            print("task start")
+    with ProcessPoolExecutor(max_workers=os.cpu_count()) as executor:
+        async with create_client() as client:
+            all_langs = ['all'] + await get_trending_languages(client)
+            for date_range in date_ranges:
+                urls = [f"https://github.com/trending?since={date_range}"] + [f"https://github.com/trending/{i}?since={date_range}" for i in all_langs]
+                print("task start")
             
-            # asyncio.gatherで全てのタスクを並列に実行し、結果を待つ
-            # resultsには各タスクの戻り値(リポジトリのリスト)が格納される
-            results = await asyncio.gather(*tasks)
+                # TaskGroupで各URLに対する非同期タスクを並列に実行し、全ての完了を待つ
+                # resultsには各タスクの戻り値(リポジトリのリスト)が格納される
+                async with asyncio.TaskGroup() as tg:
+                    tasks = [tg.create_task(get_github_trending_repositories_async(client, url, semaphore, limiter, executor)) for url in urls]
+                results = [task.result() for task in tasks]
 
-            print("task end")
-            current_country = 'all'
-            for result, lang in zip(results, all_langs):
-                if len(result) == 0:
-                    continue
-                for repo in result:
-                    if repo['repository_name'] in output.keys():
-                        output[repo['repository_name']]['published'].append({'language':lang, 'spoken_language_code': current_country, 'since': date_range})
-                    else:
-                        output[repo['repository_name']] = repo
-                        output[repo['repository_name']]['published'] = [{'language':lang, 'spoken_language_code': current_country, 'since': date_range}]
-                if lang != "all":
-                    langs.append(lang)
-        
-            for current_country in countries:
-                urls = [f"https://github.com/trending?since={date_range}&spoken_language_code={current_country}"] + [f"https://github.com/trending/{i}?since={date_range}&spoken_language_code={current_country}" for i in langs]
-                tasks = [get_github_trending_repositories_async(session, url, semaphore) for url in urls]
-                print("task start")
-                results = await asyncio.gather(*tasks)
                 print("task end")
-                for result, lang in zip(results, langs):
+                current_country = 'all'
+                for result, lang in zip(results, all_langs):
+                    if len(result) == 0:
+                        continue
                     for repo in result:
                         if repo['repository_name'] in output.keys():
                             output[repo['repository_name']]['published'].append({'language':lang, 'spoken_language_code': current_country, 'since': date_range})
                         else:
                             output[repo['repository_name']] = repo
                             output[repo['repository_name']]['published'] = [{'language':lang, 'spoken_language_code': current_country, 'since': date_range}]
+                    if lang != "all":
+                        langs.append(lang)
+        
+                for current_country in countries:
+                    urls = [f"https://github.com/trending?since={date_range}&spoken_language_code={current_country}"] + [f"https://github.com/trending/{i}?since={date_range}&spoken_language_code={current_country}" for i in langs]
+                    print("task start")
+                    async with asyncio.TaskGroup() as tg:
+                        tasks = [tg.create_task(get_github_trending_repositories_async(client, url, semaphore, limiter, executor)) for url in urls]
+                    results = [task.result() for task in tasks]
+                    print("task end")
+                    for result, lang in zip(results, langs):
+                        for repo in result:
+                            if repo['repository_name'] in output.keys():
+                                output[repo['repository_name']]['published'].append({'language':lang, 'spoken_language_code': current_country, 'since': date_range})
+                            else:
+                                output[repo['repository_name']] = repo
+                                output[repo['repository_name']]['published'] = [{'language':lang, 'spoken_language_code': current_country, 'since': date_range}]
     
-    if not os.path.exists(output_dir):
-        os.mkdir(output_dir)
+    os.makedirs(output_dir, exist_ok=True)
     save_dict(f'{output_dir}/latest.json', list(output.values()))
             
             
@@ -231,5 +109,5 @@ async def main():
 if __name__ == "__main__":
     import time
     start = time.perf_counter()
-    asyncio.run(main())
+    run_async(main())
     print(f'time: {time.perf_counter() - start}[s]')
@@ -5,6 +5,8 @@ from typing import List, Dict
 from bs4 import BeautifulSoup
 import requests
 
+from utils import SESSION
+
 def get_github_trending_repositories(url: str) -> List[Dict]:
     """
     指定されたGitHub TrendingのURLからリポジトリ情報をスクレイピングし、
@@ -18,10 +20,7 @@ def get_github_trending_repositories(url: str) -> List[Dict]:
         取得に失敗した場合は空のリストを返します。
     """
     try:
-        headers = {
-            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
-        }
-        response = requests.get(url, headers=headers)
+        response = SESSION.get(url, timeout=10)
         response.raise_for_status()  # HTTPエラーがあれば例外を発生させる
     except requests.RequestException as e:
         print(f"Error fetching URL {url}: {e}")
@@ -84,8 +83,7 @@ def get_github_trending_repositories(url: str) -> List[Dict]:
 def main():
     folder = 'temp'
     data = get_github_trending_repositories('https://github.com/trending')
-    if not os.path.exists(folder):
-        os.mkdir(folder)
+    os.makedirs(folder, exist_ok=True)
     sorted_data = sorted(data, key=lambda x: x["repository_name"])
     with open(f'{folder}/data.json', 'w', encoding='utf-8') as f:
         json.dump(sorted_data, f, ensure_ascii=False, indent=2)
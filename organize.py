@@ -1,12 +1,21 @@
 from datetime import datetime, timezone, timedelta
-import glob
-import json
+import argparse
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
 import os
+import pickle
+
+from utils import load_dict, save_dict
+
+# temp/*.json の解析結果のキャッシュ (パス -> (mtime, 解析済みのリスト))
+CACHE_PATH = os.path.join("temp", ".cache.pkl")
 
 def get_json_files():
     temp_dir = "temp"
-    # temp直下の *.json を検索
-    return [i for i in glob.glob(os.path.join(temp_dir, "*.json")) if i != 'temp/data.json']
+    # temp直下の *.json を検索 (globより軽いscandirで一覧を取得し、.etag.json などの隠しファイルは除く)
+    with os.scandir(temp_dir) as it:
+        return [entry.path for entry in it if entry.name.endswith('.json') and not entry.name.startswith('.') and entry.name != 'data.json' and entry.is_file()]
 
 def get_jst_time():
     # 現在のUTC時刻
@@ -19,32 +28,82 @@ def get_jst_time():
     jst_str = jst_now.strftime("%Y_%m_%d_%H")
     return jst_str
 
-def save_dict(path:str, data:dict):
-    with open(path, 'w', encoding='utf-8') as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
+def load_cache(path:str) -> dict:
+    # 壊れたキャッシュや古い形式のキャッシュは、空のキャッシュとして扱う
+    try:
+        with open(path, 'rb') as f:
+            cache = pickle.load(f)
+    except Exception:
+        return {}
+    if not isinstance(cache, dict):
+        return {}
+    return {path: entry for path, entry in cache.items() if isinstance(entry, tuple) and len(entry) == 2}
+
+def save_cache(path:str, cache:dict):
+    with open(path, 'wb') as f:
+        pickle.dump(cache, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+def load_with_cache(file_paths: list) -> dict:
+    """
+    前回から更新されていないファイルはキャッシュを使い、変更のあったファイルだけ読み込みます。
+    同じtemp/を繰り返し集計するローカル実行向けです。
+    """
+    cache = load_cache(CACHE_PATH)
+    mtimes = {file_path: os.stat(file_path).st_mtime for file_path in file_paths}
+    changed_paths = [file_path for file_path in file_paths if file_path not in cache or cache[file_path][0] != mtimes[file_path]]
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        loaded = dict(zip(changed_paths, executor.map(load_dict, changed_paths)))
+    new_cache = {file_path: (mtimes[file_path], loaded[file_path] if file_path in loaded else cache[file_path][1]) for file_path in file_paths}
+    # 変更がなければ書き直さない。マージで中身を書き換える前に保存する
+    if changed_paths or new_cache.keys() != cache.keys():
+        save_cache(CACHE_PATH, new_cache)
+    return {file_path: repos for file_path, (_, repos) in new_cache.items()}
+
+def iter_loaded(file_paths:list, max_workers:int=8):
+    """
+    ファイルをスレッドプールで先読みしながら、file_pathsの順に (パス, 読み込んだ内容) を返します。
+    先読みはmax_workers件までに制限し、読み込み済みのリストが溜まり続けないようにします。
+    """
+    paths = iter(file_paths)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        pending = deque((file_path, executor.submit(load_dict, file_path)) for file_path in islice(paths, max_workers))
+        while pending:
+            file_path, future = pending.popleft()
+            next_path = next(paths, None)
+            if next_path is not None:
+                pending.append((next_path, executor.submit(load_dict, next_path)))
+            yield file_path, future.result()
 
-def load_dict(path:str):
-    with open(path, 'r', encoding='utf-8') as f:
-        return json.load(f)
+def merge_repos(output:dict, repos:list):
+    for repo in repos:
+        merged = output.setdefault(repo['repository_name'], repo)
+        if merged is not repo:
+            merged['published'].extend(repo['published'])
 
-def main():
+def main(use_cache:bool=False):
     output_dir = './data'
     print("JST :", get_jst_time())
 
     output = {}
-    for file_path in get_json_files():
-        print(f'Current: {file_path}')
-        for repo in load_dict(file_path):
-            if repo['repository_name'] in output.keys():
-                output[repo['repository_name']]['published'].extend(repo['published'])
-            else:
-                output[repo['repository_name']] = repo
+    file_paths = get_json_files()
+    if use_cache:
+        repos_by_path = load_with_cache(file_paths)
+        for file_path in file_paths:
+            print(f'Current: {file_path}')
+            merge_repos(output, repos_by_path[file_path])
+    else:
+        for file_path, repos in iter_loaded(file_paths):
+            print(f'Current: {file_path}')
+            merge_repos(output, repos)
 
-    if not os.path.exists(output_dir):
-        os.mkdir(output_dir)
+    os.makedirs(output_dir, exist_ok=True)
 
     save_dict(f'{output_dir}/latest.json', list(output.values()))
     save_dict(f'{output_dir}/{get_jst_time()}.json', list(output.values()))
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser()
+    # CIでは毎回新しいtemp/から集計するので、キャッシュはローカルで繰り返し実行する場合のみ使う
+    parser.add_argument('--use_cache', action='store_true')
+    args = parser.parse_args()
+    main(args.use_cache)
@@ -0,0 +1,107 @@
+import asyncio
+import os
+from typing import Coroutine, List
+from urllib.parse import urlparse
+
+import httpx
+import orjson
+import requests
+from selectolax.lexbor import LexborHTMLParser
+
+try:
+    import uvloop
+except ImportError:
+    # uvloopはWindowsでは使えないので、その場合は標準のイベントループを使う
+    uvloop = None
+
+TRENDING_URL = "https://github.com/trending"
+
+# 同期処理で使う共通のセッション (keep-aliveで同じTCP/TLS接続を再利用する)
+SESSION = requests.Session()
+SESSION.headers.update({
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
+})
+
+async def fetch_trending_page(client: httpx.AsyncClient) -> bytes | None:
+    """
+    GitHub TrendingページのHTMLを取得します。
+
+    Returns:
+        HTMLのbytes (UTF-8)。取得に失敗した場合はNone。
+    """
+    print(f"Fetching {TRENDING_URL}...")
+    try:
+        response = await client.get(TRENDING_URL)
+        response.raise_for_status()
+    except httpx.HTTPError as e:
+        print(f"Error fetching URL {TRENDING_URL}: {e}")
+        return None
+
+    return response.content
+
+def parse_trending_languages(tree: LexborHTMLParser) -> List[str]:
+    """
+    解析済みのGitHub Trendingページからプログラミング言語のリストを抽出します。
+    URLで使用できる形式（例: 'python', 'rust'）で返されます。
+
+    Returns:
+        プログラミング言語の文字列リスト。
+        見つからなかった場合は空のリストを返します。
+    """
+    languages = []
+    # Languageドロップダウンメニューのコンテナを探す
+    language_menu = tree.css_first('details#select-menu-language')
+    if not language_menu:
+        return []
+
+    # 'data-filter-list' 属性を持つリスト本体を探す
+    language_list_container = language_menu.css_first('div[data-filter-list]')
+    if not language_list_container:
+        return []
+
+    # 各言語のリンクから言語名を抽出
+    for lang_link in language_list_container.css('a'):
+        href = lang_link.attributes['href']
+        # URLのパス部分から言語名を取得 (例: /trending/python?since=daily -> python)
+        path = urlparse(href).path
+        parts = path.split('/')
+        if len(parts) > 2:
+            language_slug = parts[2]
+            languages.append(language_slug)
+
+    return languages
+
+async def get_trending_languages(client: httpx.AsyncClient) -> List[str]:
+    """
+    GitHub Trendingページからプログラミング言語のリストを取得します。
+    URLで使用できる形式（例: 'python', 'rust'）で返されます。
+
+    Returns:
+        プログラミング言語の文字列リスト。
+        取得に失敗した場合は空のリストを返します。
+    """
+    html = await fetch_trending_page(client)
+    if html is None:
+        return []
+    return parse_trending_languages(LexborHTMLParser(html))
+
+def save_dict(path:str, data:dict):
+    # orjsonはUTF-8のbytesを直接返すので、バイナリモードでそのまま書き込む
+    # 途中で中断されても壊れたファイルが残らないよう、一時ファイルに書いてから置き換える
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(orjson.dumps(data, option=orjson.OPT_INDENT_2))
+    os.replace(tmp_path, path)
+
+def load_dict(path:str):
+    with open(path, 'rb') as f:
+        return orjson.loads(f.read())
+
+def run_async(main: Coroutine):
+    """
+    コルーチンを実行します。
+    uvloopが使える環境では、標準のイベントループより高速なuvloop上で実行します。
+    """
+    if uvloop is None:
+        return asyncio.run(main)
+    return uvloop.run(main)